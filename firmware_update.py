@@ -2,13 +2,58 @@
 
 import argparse
 import hashlib
+import logging
 import os
 import string
 import threading
+import time
 from collections import namedtuple, defaultdict
 from datetime import datetime
 
-from flask import Flask, send_file, request, abort, make_response
+from flask import Flask, Response, send_file, request, abort, make_response
+
+import metrics
+
+
+log = logging.getLogger("firmware_update")
+
+version_parse_seconds = metrics.Histogram("fw_version_parse_seconds", "Time to parse a version string")
+version_parse_failures = metrics.Counter("fw_version_parse_failures_total", "Unparseable version strings")
+lock_wait_seconds = metrics.Histogram("fw_lock_wait_seconds", "Time waiting for the firmware lock in get_firmware")
+prepare_seconds = metrics.Histogram("fw_prepare_seconds", "Time to rescan and rehash a firmware file",
+                                    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+requests_total = metrics.Counter("fw_requests_total", "Requests per endpoint and status", ("endpoint", "status"))
+bytes_served = metrics.Counter("fw_bytes_served_total", "Firmware bytes served per endpoint", ("endpoint",))
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most ``rate`` records per second through for each message."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        # rates below one message per second still need room for a whole message
+        self.capacity = max(1.0, rate)
+        self.allowance = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.allowance.get(record.msg, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self.allowance[record.msg] = (tokens, now)
+                return False
+
+            self.allowance[record.msg] = (tokens - 1.0, now)
+            return True
+
+
+def log_event(level, event, **fields):
+    # the event name is the message, so the rate limit applies per event
+    if log.isEnabledFor(level):
+        log.log(level, event + "".join(" {}=%r".format(key) for key in fields), *fields.values())
 
 
 def strings(filename, min_len=4):
@@ -38,6 +83,7 @@ class Firmware(object):
         self.version = version
         self.filename = os.path.abspath(os.path.expanduser(filename))
         self.md5 = gen_md5(filename)
+        self.size = os.path.getsize(filename)
         self.file_time = file_time
 
     def __str__(self):
@@ -57,7 +103,7 @@ class Config(object):
         self.fwlock = threading.RLock()
 
     def add(self, firmware_name, firmware):
-        print("INFO: add firmware: {}".format(firmware))
+        log_event(logging.INFO, "add_firmware", name=firmware_name, firmware=str(firmware))
         self.firmwares[firmware_name] = firmware
 
     def set_dirty(self, firmware_name):
@@ -65,42 +111,52 @@ class Config(object):
             self.is_dirty.add(firmware_name)
 
     def get_firmware(self, firmare_name, date):
+        start = time.perf_counter()
         with self.fwlock:
+            lock_wait_seconds.observe(time.perf_counter() - start)
+
             firmware = self.firmwares.get(firmare_name)
             if firmare_name in self.is_dirty:
-                print("INFO: File {} dirty - recompute .. ".format(firmare_name))
+                log_event(logging.INFO, "firmware_dirty", name=firmare_name)
                 self.is_dirty.remove(firmare_name)
                 firmware = prepare_fw(firmware.filename, self.stat)
-                print("INFO: new fw: {}".format(firmware))
+                log_event(logging.INFO, "firmware_updated", name=firmare_name, firmware=str(firmware))
                 self.firmwares[firmare_name] = firmware
 
             if firmware:
                 if self.check and firmware.changed:
-                    print("INFO: firmware {} changed ..".format(firmare_name))
+                    log_event(logging.INFO, "firmware_changed", name=firmare_name)
                     firmware = prepare_fw(firmware.filename, self.stat)
-                    print("INFO: new fw: {}".format(firmware))
+                    log_event(logging.INFO, "firmware_updated", name=firmare_name, firmware=str(firmware))
                     self.firmwares[firmare_name] = firmware
 
                 if firmware.version > date:
                     return firmware
-                print("INFO: Our firmware is not newer: {}".format(firmware))
+                log_event(logging.DEBUG, "firmware_not_newer", name=firmare_name, version=str(firmware.version))
                 return None
-            print("WARN: Ho firmware set for {}".format(firmare_name))
+            log_event(logging.WARNING, "no_firmware", name=firmare_name)
 
         return None
 
 
 def parse_fw(input_str):
     try:
-        return datetime.strptime(input_str, "TENT_VERSION::%b %d %Y::%H:%M:%S")
+        with version_parse_seconds.time():
+            return datetime.strptime(input_str, "TENT_VERSION::%b %d %Y::%H:%M:%S")
     except ValueError:
-        print("WARN: cannot parse version date {}".format(input_str))
+        version_parse_failures.inc()
+        log_event(logging.WARNING, "unparseable_version", version=input_str)
         return None
 
 
 def prepare_fw(filename, stat):
+    with prepare_seconds.time():
+        return _prepare_fw(filename, stat)
+
+
+def _prepare_fw(filename, stat):
     if not os.path.exists(filename):
-        print("WARN: File {} does not exist.".format(filename))
+        log_event(logging.WARNING, "missing_file", filename=filename)
         return None
 
     file_time = datetime.fromtimestamp(os.path.getmtime(filename))
@@ -112,7 +168,7 @@ def prepare_fw(filename, stat):
                 if version_timestamp:
                     return Firmware(version_timestamp, filename, file_time)
 
-        print("WARN: No timestamp found in {}".format(filename))
+        log_event(logging.WARNING, "no_timestamp", filename=filename)
 
     return Firmware(file_time, filename, file_time)
 
@@ -120,7 +176,7 @@ def prepare_fw(filename, stat):
 def get_version(request_headers):
     data = request_headers.get("X-Esp8266-Version", request_headers.get("HTTP_X_ESP8266_VERSION", None))
     if not data:
-        print("WARN: No version in request header")
+        log_event(logging.WARNING, "no_version_header")
         return None
 
     return parse_fw(data)
@@ -130,17 +186,30 @@ config = None
 app = Flask(__name__)
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def endpoint_label(endpoint_name):
+    # arbitrary paths would add a new metric series per request
+    return endpoint_name if endpoint_name in config.firmwares else "other"
+
+
 @app.route("/<endpoint_name>")
 def endpoint(endpoint_name):
     version = get_version(request.headers)
     if version:
-        print("INFO: got request with version {}".format(version))
+        log_event(logging.DEBUG, "request", endpoint=endpoint_name, version=str(version))
         firmware = config.get_firmware(endpoint_name, version)
         if firmware:
             resp = make_response(
                 send_file(firmware.filename, mimetype="application/octet-stream", as_attachment=True))
             resp.headers["x-MD5"] = firmware.md5
+            requests_total.inc(endpoint=endpoint_label(endpoint_name), status=200)
+            bytes_served.inc(firmware.size, endpoint=endpoint_label(endpoint_name))
             return resp
+    requests_total.inc(endpoint=endpoint_label(endpoint_name), status=304)
     return "", 304
 
 
@@ -161,17 +230,31 @@ class Watcher(threading.Thread):
         for dirname in dirs:
             ino.add_watch(dirname.encode("utf-8"), mask=mask)
 
-        print("INFO: Inotify watcher started")
+        log_event(logging.INFO, "watcher_started")
 
         for event in ino.event_gen():
             if event is not None:
                 (header, type_names, watch_path, filename) = event
                 for watch_instance in dirs[watch_path.decode("utf-8")]:
                     if watch_instance.file == filename.decode("utf-8"):
-                        print("Update {}".format(watch_instance))
+                        log_event(logging.INFO, "file_event", name=watch_instance.name, file=watch_instance.file)
                         config.set_dirty(watch_instance.name)
 
 
+def load_config(firmware_files, use_stat, watch):
+    result = Config(stat=use_stat, check_before_compare=(watch == "stat"))
+
+    for name in ("led_fw", "gyro_fw"):
+        if firmware_files.get(name):
+            firmware = prepare_fw(firmware_files.get(name), use_stat)
+            if firmware:
+                result.add(name, firmware)
+                continue
+        log_event(logging.INFO, "no_firmware_given", name=name)
+
+    return result
+
+
 parser = argparse.ArgumentParser(description="Firmware update service")
 parser.add_argument("--led_fw", help="Filename of led firmware", required=False)
 parser.add_argument("--gyro_fw", help="Filename for gyro firmware", required=False)
@@ -181,6 +264,26 @@ parser.add_argument("--watch", help="Watch for file system changes with inotify"
                     default="stat")
 parser.add_argument("--port", help="The port to bind the server", default=6655)
 parser.add_argument("--host", help="The host address to bind the server", default="0.0.0.0")
+parser.add_argument("--log_level", help="Log level, 'off' disables logging", choices=["debug", "info", "warning", "off"],
+                    default="info")
+parser.add_argument("--log_rate", help="Maximal log messages per second and event", default=5.0, type=float)
+
+
+def setup_logging(level, rate):
+    # only touch our own loggers, the tent daemon shares the process with other services
+    log.propagate = False
+    # werkzeug logs every request, the metrics cover that
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    if level == "off":
+        log.disabled = True
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s level=%(levelname)s event=%(message)s"))
+    handler.addFilter(RateLimitFilter(rate))
+    log.addHandler(handler)
+    log.setLevel(getattr(logging, level.upper()))
+
 
 if __name__ == "__main__":
 
@@ -190,16 +293,9 @@ if __name__ == "__main__":
     port = int(args.port)
     host = args.host
 
-    config = Config(stat=use_stat, check_before_compare=(watch == "stat"))
+    setup_logging(args.log_level, args.log_rate)
 
-    args = vars(args)
-    for name in ("led_fw", "gyro_fw"):
-        if name in args and args.get(name):
-            led_fw = prepare_fw(args.get(name), use_stat)
-            if led_fw:
-                config.add(name, led_fw)
-                continue
-        print("INFO: No {} given".format(name))
+    config = load_config(vars(args), use_stat, watch)
 
     if watch == "inotify":
         Watcher().start()
@@ -1,33 +1,27 @@
 #!/usr/bin/python3
 import socketserver
-import struct
 import argparse
 
+import quaternion_math
 
-data_structs = [
-        struct.Struct("=L"),
-        struct.Struct("=HHHHH")]
-data_size = sum(s.size for s in data_structs)
+
+def print_packet(data):
+    data_size = quaternion_math.packet_dtype.itemsize
+    print("packet:", len(data), "bytes, ", len(data) / data_size, "points")
+
+    packets, quaternions = quaternion_math.unpack_packets(data)
+    yaws = quaternion_math.quaternion_to_euler(quaternions)[:, 0]
+
+    # iter datapoints
+    for i, (packet, q, yaw) in enumerate(zip(packets, quaternions, yaws)):
+        print("point:", i, "time:", packet["time"], "counter:", packet["counter"],
+              "quaternion:", q.round(4).tolist(), "yaw: {:.4f}".format(yaw))
 
 
 class UDPHandler(socketserver.BaseRequestHandler):
     def handle(self):
-        data = self.request[0]
-        print("packet:", len(data), "bytes, ", len(data) / data_size, "points")
-
-        # iter datapoints
-        for i in range(len(data) // data_size):
-            offset = i * data_size
-            data_items = []
-
-            # iter structs
-            for st in data_structs:
-                item = data[offset:(offset + st.size)]
-                data_items.extend(st.unpack(item))
-                offset += st.size
-
-            print("point:", i, "data:", data_items)
-        
+        print_packet(self.request[0])
+
 
 parser = argparse.ArgumentParser(description="Simple syslog message receiver")
 parser.add_argument("--host", help="Hostname to listen on", default="0.0.0.0")
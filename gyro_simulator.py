@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-from collections import namedtuple
 import argparse
 import socket
 import struct
@@ -8,33 +7,18 @@ import time
 import math
 import sys
 
-import pygame
+try:
+    import pygame
+except ImportError:
+    # only needed for the interactive PygameController
+    pygame = None
 
-
-Quaternion = namedtuple("Quaternion", ["w", "x", "y", "z"])
+import quaternion_math
 
 
 def angle_to_quaternion(angle):
-    yaw = angle
-    pitch = 1.0
-    roll = 2.0
-
-    t0 = math.cos(yaw * 0.5)
-    t1 = math.sin(yaw * 0.5)
-    t2 = math.cos(roll * 0.5)
-    t3 = math.sin(roll * 0.5)
-    t4 = math.cos(pitch * 0.5)
-    t5 = math.sin(pitch * 0.5)
-
-    return Quaternion(
-        w=(t0 * t2 * t4 + t1 * t3 * t5),
-        x=(t0 * t3 * t4 - t1 * t2 * t5),
-        y=(t0 * t2 * t5 + t1 * t3 * t4),
-        z=(t1 * t2 * t4 - t0 * t3 * t5))
-
-
-def _short_val(val):
-    return int(val * 16384.0)
+    # fixed point w, x, y, z, see quaternion_math.encode_angle
+    return quaternion_math.encode_angle(angle, pitch=1.0, roll=2.0)
 
 
 class Sender(object):
@@ -50,12 +34,7 @@ class Sender(object):
 
     def send(self, quaternion):
         tp = int(time.time() * 1000) - self.start
-        data = self.struct.pack(tp,
-                                _short_val(quaternion.w),
-                                _short_val(quaternion.x),
-                                _short_val(quaternion.y),
-                                _short_val(quaternion.z),
-                                self.counter % 65535)
+        data = self.struct.pack(tp, *quaternion, self.counter % 65535)
 
         self.sock.sendto(data, (self.host, self.port));
 
@@ -3,13 +3,86 @@
 import lirc
 import requests
 import argparse
+import queue
+import threading
+import time
+
+
+class Dispatcher(threading.Thread):
+    """Send the HTTP requests from a background thread.
+
+    Requests go through one session so the connection to the music server
+    is reused. A command is dropped while the same command is still pending
+    or was sent less than ``repeat_interval`` seconds ago, so a held-down
+    key doesn't pile up requests.
+    """
+
+    def __init__(self, timeout=2.0, repeat_interval=0.2):
+        super().__init__(daemon=True)
+        self.timeout = timeout
+        self.repeat_interval = repeat_interval
+        self.queue = queue.Queue()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.last_sent = {}
+        self.latency = {}
+
+    def submit(self, command, url):
+        now = time.monotonic()
+        with self.lock:
+            if command in self.pending:
+                return False
+            if now - self.last_sent.get(command, float("-inf")) < self.repeat_interval:
+                return False
+
+            self.pending.add(command)
+            self.last_sent[command] = now
+
+        self.queue.put((command, url, now))
+        return True
+
+    def run(self):
+        while True:
+            command, url, received = self.queue.get()
+            # never let one bad request end the worker, IR control would silently stop
+            try:
+                self._dispatch(command, url, received)
+            except Exception as e:
+                print("Request for {} to {} failed: {!r}".format(command, url, e))
+
+    def _dispatch(self, command, url, received):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except IOError as e:
+            print("Could not connect to {}: {}".format(url, e))
+            return
+        finally:
+            with self.lock:
+                self.pending.discard(command)
+
+        self._record(command, url, response.status_code, time.monotonic() - received)
+
+    def _record(self, command, url, status, latency):
+        count, total, worst = self.latency.get(command, (0, 0.0, 0.0))
+        count, total, worst = count + 1, total + latency, max(worst, latency)
+        self.latency[command] = (count, total, worst)
+
+        print("INFO: {} -> {} [{}] in {:.1f} ms (avg {:.1f} ms, max {:.1f} ms)".format(
+            command, url, status, latency * 1000.0, total * 1000.0 / count, worst * 1000.0))
 
 
 class Receiver(object):
-    def __init__(self, proc_name, base_url, url_map):
+    def __init__(self, proc_name, base_url, url_map, dispatcher):
         self.sockid = lirc.init(proc_name, blocking=True)
         self.base_url = base_url
         self.url_map = url_map
+        self.dispatcher = dispatcher
 
     def run(self):
         while True:
@@ -27,10 +100,7 @@ class Receiver(object):
             url = self.url_map[command]
 
             full_url = '{}{}'.format(self.base_url, url)
-            try:
-                response = requests.get(full_url)
-            except IOError as e:
-                print("Could not connect to {}: {}".format(full_url, e))
+            self.dispatcher.submit(command, full_url)
 
 
 def parse_command(inp_cmd):
@@ -41,6 +111,9 @@ def parse_command(inp_cmd):
 parser = argparse.ArgumentParser(description="Lirc receiver")
 parser.add_argument("--name", help="Program name to lircd", default="tent-ir")
 parser.add_argument("--base", help="Set base url", required=True)
+parser.add_argument("--timeout", help="Timeout for the http requests in seconds", default=2.0, type=float)
+parser.add_argument("--repeat", help="Minimal interval between two requests of the same command in seconds",
+                    default=0.2, type=float)
 parser.add_argument("commands", help="The command-url mappings in the form command:url", nargs="+", type=parse_command)
 
 default_commands = {
@@ -60,6 +133,9 @@ if __name__ == "__main__":
     else:
         url_map = dict(url_map)
 
-    handler = Receiver(args.name, args.base, url_map)
+    dispatcher = Dispatcher(args.timeout, args.repeat)
+    dispatcher.start()
+
+    handler = Receiver(args.name, args.base, url_map, dispatcher)
 
     handler.run()
@@ -0,0 +1,120 @@
+"""Minimal Prometheus style counters and histograms.
+
+Metrics register themselves in a ``Registry`` (the module level ``registry``
+by default) which renders all of them in the Prometheus text format.
+Updates only take a lock and touch a dict, so they are cheap enough for
+the request hot path.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return "".join(metric.render() for metric in metrics)
+
+
+registry = Registry()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = ['{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+             for name, value in list(zip(names, values)) + list(extra)]
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric(object):
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=registry):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.register(self)
+
+    def _copy_value(self, value):
+        return value
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help_text),
+                 "# TYPE {} {}".format(self.name, self.type_name)]
+        with self.lock:
+            items = sorted((key, self._copy_value(value)) for key, value in self.values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        yield "{}{} {}".format(self.name, _format_labels(self.labelnames, key), value)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=registry):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _copy_value(self, value):
+        counts, total = value
+        return list(counts), total
+
+    def _render_value(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield "{}_bucket{} {}".format(self.name, _format_labels(self.labelnames, key, [("le", le)]),
+                                          cumulative)
+        labels = _format_labels(self.labelnames, key)
+        yield "{}_sum{} {}".format(self.name, labels, total)
+        yield "{}_count{} {}".format(self.name, labels, cumulative)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+
+
+file_magic = b"TENTCAP1"
+# receive time relative to the first packet in seconds, payload length
+record_header = struct.Struct("=dH")
+
+
+class Recorder(object):
+    def __init__(self, host, port, filename):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.count = 0
+
+    def run(self):
+        start = None
+        with open(self.filename, "wb") as f:
+            f.write(file_magic)
+            while True:
+                try:
+                    data = self.socket.recv(65535)
+                    now = time.perf_counter()
+                    if start is None:
+                        start = now
+
+                    f.write(record_header.pack(now - start, len(data)))
+                    f.write(data)
+                    self.count += 1
+                except KeyboardInterrupt:
+                    print("INFO: recorded {} packets to {}".format(self.count, self.filename))
+                    return
+
+
+def read_capture(filename):
+    """Yield (timestamp, payload) tuples from a capture file.
+
+    The file is memory mapped, so only the pages of the packets currently
+    replayed have to be resident.
+    """
+    with open(os.path.abspath(os.path.expanduser(filename)), "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(file_magic)] != file_magic:
+                raise ValueError("{} is not a capture file".format(filename))
+
+            offset = len(file_magic)
+            size = len(mm)
+            while offset + record_header.size <= size:
+                timestamp, length = record_header.unpack_from(mm, offset)
+                offset += record_header.size
+                if offset + length > size:
+                    print("WARN: truncated packet at end of {}".format(filename))
+                    return
+
+                yield timestamp, mm[offset:offset + length]
+                offset += length
+
+
+class Scheduler(object):
+    """Wait for deadlines with sub-millisecond precision.
+
+    ``time.sleep`` alone overshoots by up to a scheduler tick, so we sleep
+    until shortly before the deadline and busy wait for the remainder.
+    """
+
+    def __init__(self, spin=0.002):
+        self.spin = spin
+
+    def wait_until(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+
+        while time.perf_counter() < deadline:
+            pass
+
+
+class Player(object):
+    def __init__(self, host, port, speed=1.0, scheduler=None):
+        self.address = (host, port)
+        self.speed = speed
+        self.scheduler = scheduler or Scheduler()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.sent = 0
+        self.max_late = 0.0
+
+    def play(self, filename):
+        start = time.perf_counter()
+        for timestamp, data in read_capture(filename):
+            if self.speed > 0:
+                deadline = start + timestamp / self.speed
+                self.scheduler.wait_until(deadline)
+                self.max_late = max(self.max_late, time.perf_counter() - deadline)
+
+            self.sock.sendto(data, self.address)
+            self.sent += 1
+
+    def __str__(self):
+        return "sent {} packets, max lateness {:.3f} ms".format(self.sent, self.max_late * 1000.0)
+
+
+parser = argparse.ArgumentParser(description="Record and replay UDP gyro or led traffic")
+subparsers = parser.add_subparsers(dest="mode")
+subparsers.required = True
+
+record_parser = subparsers.add_parser("record", help="Record UDP packets into a capture file")
+record_parser.add_argument("--host", help="Hostname to listen on", default="0.0.0.0")
+record_parser.add_argument("--port", help="Port to listen on", default=7000, type=int)
+record_parser.add_argument("file", help="Capture file to write")
+
+play_parser = subparsers.add_parser("play", help="Replay a capture file")
+play_parser.add_argument("--host", help="Hostname to send to", default="127.0.0.1")
+play_parser.add_argument("--port", help="Port to send to", default=7000, type=int)
+play_parser.add_argument("--speed", help="Replay speed factor, 0 sends as fast as possible", default=1.0,
+                         type=float)
+play_parser.add_argument("--loop", help="Replay the capture in an endless loop", action="store_true",
+                         default=False)
+play_parser.add_argument("file", help="Capture file to replay")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        Recorder(args.host, args.port, args.file).run()
+        sys.exit(0)
+
+    player = Player(args.host, args.port, args.speed)
+    try:
+        while True:
+            player.play(args.file)
+            if not args.loop:
+                break
+    except KeyboardInterrupt:
+        pass
+
+    print("INFO: {}".format(player))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+"""Vectorized helpers for the gyro quaternion format.
+
+The gyro sends quaternions as signed 16 bit fixed point values scaled by
+16384 in ``=LhhhhH`` packets (time in ms, w, x, y, z, counter). All
+functions work on numpy arrays with the components in the last axis
+ordered ``w, x, y, z``, so single quaternions and batches share one path.
+For one quaternion per call numpy's overhead dominates, so ``encode_angle``
+is a plain ``math`` version for the simulator's per frame encoding.
+"""
+
+import functools
+import math
+
+import numpy as np
+
+
+SCALE = 16384.0
+
+packet_dtype = np.dtype([
+    ("time", "=u4"),
+    ("w", "=i2"),
+    ("x", "=i2"),
+    ("y", "=i2"),
+    ("z", "=i2"),
+    ("counter", "=u2")])
+
+
+@functools.lru_cache(maxsize=32)
+def _half_angle_terms(pitch, roll):
+    # the simulator only rotates the yaw, so the pitch/roll products are constant
+    cr, sr = math.cos(roll * 0.5), math.sin(roll * 0.5)
+    cp, sp = math.cos(pitch * 0.5), math.sin(pitch * 0.5)
+    return cr * cp, sr * sp, sr * cp, cr * sp
+
+
+def euler_to_quaternion(yaw, pitch=1.0, roll=2.0):
+    cy = np.cos(np.asarray(yaw, dtype=np.float64) * 0.5)
+    sy = np.sin(np.asarray(yaw, dtype=np.float64) * 0.5)
+    crcp, srsp, srcp, crsp = _half_angle_terms(float(pitch), float(roll))
+
+    return np.stack((
+        cy * crcp + sy * srsp,
+        cy * srcp - sy * crsp,
+        cy * crsp + sy * srcp,
+        sy * crcp - cy * srsp), axis=-1)
+
+
+def encode_angle(yaw, pitch=1.0, roll=2.0):
+    """Scalar ``encode(euler_to_quaternion(yaw, pitch, roll))`` as a tuple of ints."""
+    cy, sy = math.cos(yaw * 0.5), math.sin(yaw * 0.5)
+    crcp, srsp, srcp, crsp = _half_angle_terms(pitch, roll)
+
+    return (int((cy * crcp + sy * srsp) * SCALE),
+            int((cy * srcp - sy * crsp) * SCALE),
+            int((cy * crsp + sy * srcp) * SCALE),
+            int((sy * crcp - cy * srsp) * SCALE))
+
+
+def quaternion_to_euler(q):
+    """Return ``(yaw, pitch, roll)`` in the last axis."""
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=np.float64), -1, 0)
+
+    roll = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+
+    return np.stack((yaw, pitch, roll), axis=-1)
+
+
+def normalize(q):
+    q = np.asarray(q, dtype=np.float64)
+    norm = np.linalg.norm(q, axis=-1, keepdims=True)
+    return q / np.where(norm == 0.0, 1.0, norm)
+
+
+def slerp(q0, q1, t):
+    """Spherical interpolation between ``q0`` and ``q1`` at fractions ``t``."""
+    q0 = normalize(q0)
+    q1 = normalize(q1)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    # take the short way around
+    q1 = np.where(dot < 0.0, -q1, q1)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-6
+    safe_sin = np.where(close, 1.0, sin_theta)
+
+    a = np.where(close, 1.0 - t, np.sin((1.0 - t) * theta) / safe_sin)
+    b = np.where(close, t, np.sin(t * theta) / safe_sin)
+
+    return normalize(a * q0 + b * q1)
+
+
+def encode(q):
+    """Convert float quaternions to the 16384 scaled int16 representation."""
+    values = np.trunc(np.asarray(q, dtype=np.float64) * SCALE)
+    return np.clip(values, -32768, 32767).astype(np.int16)
+
+
+def decode(values):
+    return np.asarray(values, dtype=np.float64) / SCALE
+
+
+def pack_packets(times, q, counters):
+    q = encode(q).reshape(-1, 4)
+    packets = np.empty(len(q), dtype=packet_dtype)
+    packets["time"] = times
+    packets["w"], packets["x"], packets["y"], packets["z"] = q.T
+    packets["counter"] = counters
+
+    return packets.tobytes()
+
+
+def unpack_packets(data):
+    """Parse a gyro datagram into ``(packets, quaternions)``.
+
+    Trailing bytes that don't form a full packet are ignored.
+    """
+    count = len(data) // packet_dtype.itemsize
+    packets = np.frombuffer(data, dtype=packet_dtype, count=count)
+    q = decode(np.stack((packets["w"], packets["x"], packets["y"], packets["z"]), axis=-1))
+
+    return packets, q
+
+
+if __name__ == "__main__":
+    import struct
+    import timeit
+
+    # the scalar path of the old simulator, kept as reference
+    def scalar_encode(angle, st=struct.Struct("=LhhhhH")):
+        t0 = math.cos(angle * 0.5)
+        t1 = math.sin(angle * 0.5)
+        t2 = math.cos(1.0)
+        t3 = math.sin(1.0)
+        t4 = math.cos(0.5)
+        t5 = math.sin(0.5)
+        return st.pack(0,
+                       int((t0 * t2 * t4 + t1 * t3 * t5) * 16384.0),
+                       int((t0 * t3 * t4 - t1 * t2 * t5) * 16384.0),
+                       int((t0 * t2 * t5 + t1 * t3 * t4) * 16384.0),
+                       int((t1 * t2 * t4 - t0 * t3 * t5) * 16384.0),
+                       0)
+
+    def scalar_decode(data, st=struct.Struct("=LhhhhH")):
+        return [[v / 16384.0 for v in item[1:5]] for item in st.iter_unpack(data)]
+
+    n = 10000
+    angles = np.linspace(-math.pi, math.pi, n)
+    zeros = np.zeros(n)
+    data = b"".join(scalar_encode(a) for a in angles)
+
+    batch_data = pack_packets(zeros, euler_to_quaternion(angles), zeros)
+    # products are associated differently, so allow one step of truncation difference
+    assert np.allclose(unpack_packets(batch_data)[1], scalar_decode(data), rtol=0.0, atol=1.0 / SCALE)
+    assert np.array_equal([encode_angle(a) for a in angles], encode(euler_to_quaternion(angles)))
+
+    runs = 10
+    for name, scalar, batch in (
+            ("encode", lambda: b"".join(scalar_encode(a) for a in angles),
+             lambda: pack_packets(zeros, euler_to_quaternion(angles), zeros)),
+            ("decode", lambda: scalar_decode(data),
+             lambda: unpack_packets(data))):
+        t_scalar = timeit.timeit(scalar, number=runs) / runs
+        t_batch = timeit.timeit(batch, number=runs) / runs
+        print("{}: {} quaternions, scalar {:.3f} ms, batch {:.3f} ms, speedup {:.1f}x".format(
+            name, n, t_scalar * 1000.0, t_batch * 1000.0, t_scalar / t_batch))
+
+    # the simulator encodes a single angle per frame
+    st = struct.Struct("=LhhhhH")
+    t_old = timeit.timeit(lambda: scalar_encode(0.5), number=n) / n
+    t_fast = timeit.timeit(lambda: st.pack(0, *encode_angle(0.5), 0), number=n) / n
+    t_numpy = timeit.timeit(lambda: st.pack(0, *encode(euler_to_quaternion(0.5)).tolist(), 0), number=n) / n
+    print("single frame: old scalar {:.2f} us, encode_angle {:.2f} us, numpy {:.2f} us".format(
+        t_old * 1e6, t_fast * 1e6, t_numpy * 1e6))
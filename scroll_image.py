@@ -19,6 +19,14 @@ parser.add_argument("--reboot", help="Just reboot the controller", action="store
 parser.add_argument("--brightness", help="max brightness of LEDs")
 
 
+bytes_per_packet = 800
+
+
+def led_chunks(data, max_led):
+    air_data = bytes(bytearray(data[:max_led].flatten()))
+    return [air_data[offset:offset + bytes_per_packet] for offset in range(0, len(air_data), bytes_per_packet)]
+
+
 def prepare_image(image_file):
     fname = os.path.abspath(os.path.expanduser(image_file))
     image = Image.open(fname)
@@ -47,19 +55,9 @@ if __name__ == "__main__":
     interval = 1.0 / int(args.rate)
     max_led = int(args.max)
 
-    bytes_per_packet = 800
-
-    data_len = max_led * 3
-    chunks = data_len // bytes_per_packet
-    if 0 < (data_len % bytes_per_packet):
-        chunks += 1
-
     while True:
-        part = data[:max_led]
-        air_data = bytes(bytearray(part.flatten()))
-
-        for chunk in range(chunks):
-            sock.sendto(air_data[(chunk * bytes_per_packet):(chunk + 1) * bytes_per_packet], (args.host, 7000))
+        for chunk in led_chunks(data, max_led):
+            sock.sendto(chunk, (args.host, 7000))
         data = np.roll(data, 3 * int(args.speed))
 
         time.sleep(interval)
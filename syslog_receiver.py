@@ -5,14 +5,27 @@ import argparse
 import logging
 
 
+# own logger without propagation, so only the syslog messages end up in the file
+log = logging.getLogger("syslog_receiver")
+log.propagate = False
+
+
+def setup_file_log(filename):
+    handler = logging.FileHandler(filename, mode='a')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s', datefmt='%Y-%d-%m - %H:%M:%S'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+def handle_message(raw, address):
+    data = bytes.decode(raw.strip())
+    print(datetime.datetime.now().strftime("%Y-%d-%m - %H:%M:%S"), "{} : ".format(address), str(data))
+    log.info(str(data))
+
+
 class SyslogUDPHandler(socketserver.BaseRequestHandler):
     def handle(self):
-        data = bytes.decode(self.request[0].strip())
-        socket = self.request[1]
-        print(datetime.datetime.now().strftime("%Y-%d-%m - %H:%M:%S"), "{} : ".format(self.client_address[0]),
-              str(data))
-        if log_file:
-            logging.info(str(data))
+        handle_message(self.request[0], self.client_address[0])
 
 
 parser = argparse.ArgumentParser(description="Simple syslog message receiver")
@@ -24,10 +37,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if "file" in args and args.file:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s', datefmt='%Y-%d-%m - %H:%M:%S', filename=args.file, filemode='a')
-        log_file = True
-    else:
-        log_file = False
+        setup_file_log(args.file)
 
     try:
         server = socketserver.UDPServer((args.host, args.port), SyslogUDPHandler)
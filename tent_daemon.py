@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""Run the tent services as plug-ins of one asyncio event loop.
+
+Every section of the configuration file starts one service. The section
+name selects the service type, an optional ``:suffix`` allows several
+services of the same type, e.g. ``[replay:led]`` and ``[replay:gyro]``.
+The update server keeps its state in module globals of
+:mod:`firmware_update`, so there can be only one ``ota`` service.
+The modules of a service are only imported if the service is configured,
+so unused dependencies (Flask, numpy, PIL) are not loaded.
+"""
+
+import abc
+import argparse
+import asyncio
+import configparser
+import resource
+import signal
+import sys
+
+import metrics
+
+
+packets_received = metrics.Counter("daemon_packets_received_total", "UDP packets received per service",
+                                   ("service",))
+packets_sent = metrics.Counter("daemon_packets_sent_total", "UDP packets sent per service", ("service",))
+bytes_transferred = metrics.Counter("daemon_bytes_total", "UDP payload bytes received or sent per service",
+                                    ("service",))
+
+
+class Service(abc.ABC):
+    single_instance = False
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+
+    @abc.abstractmethod
+    async def run(self):
+        """Run until cancelled, or return when the service is done."""
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        self.callback(data, addr)
+
+
+class UDPListenerService(Service):
+    default_port = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        address = (self.options.get("host", "0.0.0.0"), self.options.getint("port", self.default_port))
+        transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self._received),
+                                                           local_addr=address)
+        print("INFO: {} listening on {}:{}".format(self.name, *address))
+        try:
+            await loop.create_future()
+        finally:
+            transport.close()
+
+    def _received(self, data, address):
+        packets_received.inc(service=self.name)
+        bytes_transferred.inc(len(data), service=self.name)
+        self.handle(data, address)
+
+    @abc.abstractmethod
+    def handle(self, data, address):
+        """Process one received datagram."""
+
+
+class SyslogService(UDPListenerService):
+    default_port = 6656
+
+    def __init__(self, name, options):
+        super().__init__(name, options)
+        import syslog_receiver
+
+        if options.get("file"):
+            syslog_receiver.setup_file_log(options.get("file"))
+        self.handle_message = syslog_receiver.handle_message
+
+    def handle(self, data, address):
+        self.handle_message(data, address[0])
+
+
+class TelemetryService(UDPListenerService):
+    default_port = 7000
+
+    def __init__(self, name, options):
+        super().__init__(name, options)
+        import gyro_dump
+        self.print_packet = gyro_dump.print_packet
+
+    def handle(self, data, address):
+        self.print_packet(data)
+
+
+class OtaService(Service):
+    single_instance = True
+
+    async def run(self):
+        import firmware_update
+        from werkzeug.serving import make_server
+
+        firmware_update.setup_logging(self.options.get("log_level", "info"), self.options.getfloat("log_rate", 5.0))
+
+        watch = self.options.get("watch", "stat")
+        firmware_update.config = firmware_update.load_config(
+            self.options, self.options.get("guess_from", "strings") == "stat", watch)
+        if watch == "inotify":
+            firmware_update.Watcher(daemon=True).start()
+
+        server = make_server(self.options.get("host", "0.0.0.0"), self.options.getint("port", 6655),
+                             firmware_update.app, threaded=True)
+        print("INFO: {} serving on {}:{}".format(self.name, server.host, server.port))
+        try:
+            # werkzeug is blocking, so it gets its own thread
+            await asyncio.get_running_loop().run_in_executor(None, server.serve_forever)
+        finally:
+            server.shutdown()
+
+
+class ReplayService(Service):
+    """Stream a capture of :mod:`packet_replay` with its original timing."""
+
+    async def run(self):
+        import packet_replay
+
+        loop = asyncio.get_running_loop()
+        address = (self.options.get("host", "127.0.0.1"), self.options.getint("port", 7000))
+        speed = self.options.getfloat("speed", 1.0)
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=address)
+        try:
+            while True:
+                start = loop.time()
+                for timestamp, data in packet_replay.read_capture(self.options["file"]):
+                    # asyncio timers are millisecond precise, sleeping 0 still lets the other services run
+                    delay = start + timestamp / speed - loop.time() if speed > 0 else 0
+                    await asyncio.sleep(max(delay, 0))
+
+                    transport.sendto(data)
+                    packets_sent.inc(service=self.name)
+                    bytes_transferred.inc(len(data), service=self.name)
+
+                if not self.options.getboolean("loop", False):
+                    break
+        finally:
+            transport.close()
+
+
+class GyroSimulatorService(Service):
+    """Send the rotating angle of :mod:`gyro_simulator`'s ``--auto`` mode."""
+
+    async def run(self):
+        import gyro_simulator
+
+        sender = gyro_simulator.Sender(self.options.get("host", "127.0.0.1"), self.options.getint("port", 7002))
+        controller = gyro_simulator.ContinousController()
+        interval = 1.0 / self.options.getfloat("rate", 50.0)
+        try:
+            while True:
+                sender.send(gyro_simulator.angle_to_quaternion(controller.get_state()))
+                packets_sent.inc(service=self.name)
+                bytes_transferred.inc(sender.struct.size, service=self.name)
+                await asyncio.sleep(interval)
+        finally:
+            sender.sock.close()
+
+
+class ScrollService(Service):
+    """Scroll the first pixel row of an image like :mod:`scroll_image`."""
+
+    async def run(self):
+        import numpy as np
+        import scroll_image
+
+        loop = asyncio.get_running_loop()
+        address = (self.options["host"], self.options.getint("port", 7000))
+        data = scroll_image.prepare_image(self.options["image"])
+        max_led = self.options.getint("max")
+        speed = self.options.getint("speed", 1)
+        interval = 1.0 / self.options.getfloat("rate", 40.0)
+
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=address)
+        try:
+            while True:
+                for chunk in scroll_image.led_chunks(data, max_led):
+                    transport.sendto(chunk)
+                    packets_sent.inc(service=self.name)
+                    bytes_transferred.inc(len(chunk), service=self.name)
+                data = np.roll(data, 3 * speed)
+
+                await asyncio.sleep(interval)
+        finally:
+            transport.close()
+
+
+service_types = {
+    "ota": OtaService,
+    "syslog": SyslogService,
+    "telemetry": TelemetryService,
+    "replay": ReplayService,
+    "gyro": GyroSimulatorService,
+    "scroll": ScrollService,
+}
+
+
+def load_services(filename):
+    parser = configparser.ConfigParser()
+    if not parser.read(filename):
+        raise IOError("cannot read config file {}".format(filename))
+
+    services = []
+    for section in parser.sections():
+        service_type = section.split(":", 1)[0]
+        if service_type not in service_types:
+            raise ValueError("unknown service type '{}' in section [{}]".format(service_type, section))
+
+        service_class = service_types[service_type]
+        if service_class.single_instance and any(isinstance(s, service_class) for s in services):
+            raise ValueError("only one '{}' service is supported, got another in section [{}]".format(
+                service_type, section))
+        services.append(service_class(section, parser[section]))
+
+    return services
+
+
+def log_usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print("INFO: max rss {} kB, cpu user {:.2f} s, cpu system {:.2f} s".format(
+        usage.ru_maxrss, usage.ru_utime, usage.ru_stime))
+
+
+async def report_usage(interval):
+    while True:
+        await asyncio.sleep(interval)
+        log_usage()
+
+
+async def main(services, usage_interval):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    tasks = [asyncio.ensure_future(service.run()) for service in services]
+    helpers = [asyncio.ensure_future(stop.wait())]
+    if usage_interval > 0:
+        helpers.append(asyncio.ensure_future(report_usage(usage_interval)))
+
+    # replay services may finish on their own, everything else runs until stopped
+    pending = set(tasks)
+    while pending and not stop.is_set():
+        done, pending = await asyncio.wait(pending | {helpers[0]}, return_when=asyncio.FIRST_COMPLETED)
+        pending.discard(helpers[0])
+        for task in done:
+            if task is not helpers[0] and task.exception():
+                stop.set()
+
+    for task in tasks + helpers:
+        task.cancel()
+    await asyncio.gather(*tasks, *helpers, return_exceptions=True)
+
+    for service, task in zip(services, tasks):
+        if not task.cancelled() and task.exception():
+            print("ERROR: service {} failed: {}".format(service.name, task.exception()))
+            return 1
+    return 0
+
+
+parser = argparse.ArgumentParser(description="Tent control daemon")
+parser.add_argument("--usage", help="Interval in seconds to print memory and cpu usage, 0 to disable",
+                    default=300, type=float)
+parser.add_argument("config", help="Configuration file with one section per service")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    services = load_services(args.config)
+    result = asyncio.run(main(services, args.usage))
+    log_usage()
+
+    sys.exit(result)